@@ -8,11 +8,16 @@ To find all PRs w/copilot comments, use:
 import argparse
 import logging
 import sys
-import pandas as pd
-from math import log
+from math import log, log1p
+from typing import TYPE_CHECKING
 
-from graphics import plot_histogram, scatterplots_ai_vs_non_ai
-from repo_utils import get_pr_comments, get_pr_open_closed_and_state, get_list_of_all_prs
+from input_output import read_csv_columnar, write_csv
+from repo_utils import get_pr_comments, get_pr_states_batch, get_list_of_all_prs
+
+# pandas and matplotlib are slow to import, they are imported where they are used
+# so that e.g. `--help` returns quickly
+if TYPE_CHECKING:
+    import pandas as pd
 
 logging.basicConfig(level=logging.INFO,
                         format='%(asctime)s - %(levelname)s - %(message)s',
@@ -21,6 +26,14 @@ logging.basicConfig(level=logging.INFO,
 logger = logging.getLogger(__name__)
 
 MAX_ATTEMPTS = 3
+
+def _positive_int(value: str) -> int:
+    """Parse a command line integer that must be at least 1, e.g. a concurrency limit."""
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"must be at least 1, got {number}")
+    return number
+
 # TODO: group the args here with subparsers
 #    and then add a subparsers argument
 parser = argparse.ArgumentParser(description="Get map of pull requests with Copilot comments.", formatter_class=argparse.ArgumentDefaultsHelpFormatter)
@@ -67,6 +80,12 @@ parser.add_argument(
     choices=["copilot-pull-request-reviewer", "github-copilot", "coderabbitai"],
     help="The maximum number of pull requests to fetch.",
 )
+parser.add_argument(
+    "--max_concurrency",
+    type=_positive_int,
+    default=5,
+    help="The maximum number of concurrent requests made to the GitHub API.",
+)
 parser.add_argument(
     "--use_stdout",
     action="store_true",
@@ -80,7 +99,7 @@ parser.add_argument(
     help="Set the logging level for the CLI.",
 )
 
-def main(args) -> pd.DataFrame:
+def main(args) -> "pd.DataFrame":
     """Main function to handle the repository URL.
 
     Args:
@@ -97,60 +116,65 @@ def main(args) -> pd.DataFrame:
         print(f"Setting log level to {args.log_level}")
         logger.setLevel(getattr(logging, args.log_level))
     prs_with_reviews = get_pr_comments(owner=args.owner, repo=args.repo, login=args.AILogin, state=args.status, limit=args.limit)
-    pr_2_AI_reviews = dict()
-    for entry in prs_with_reviews:
-        logger.debug(f"Processing AI reviewed entry: {entry!r}")
-        pr_num, reviews = entry.get("number"), entry.get("reviews", [])
-        pr_2_AI_reviews[pr_num] = [review for review in reviews if review.get("author", {}).get("login") == args.AILogin]
-    records = []
-    for key, val in pr_2_AI_reviews.items():
-        for review in val:
-            attempt = 0
-            while attempt < MAX_ATTEMPTS:
-                logger.debug(f"Processing PR {key!r} w/review: {review!r}")
-                try:
-                    pr_state = get_pr_open_closed_and_state(args.owner, args.repo, key)
-                    records.append({
-                        "pr_number": key,
-                        "review_id": review.get("id"),
-                        "author_login": review.get("author", {}).get("login"),
-                        "body": review.get("body"),
-                        "state": review.get("state"),
-                        "reviewed_at": review.get("submittedAt"),
-                        "owner": args.owner,
-                        "repo": args.repo,
-                        "pr_state": pr_state,
-                        "additions": pr_state.get("additions"),
-                        "deletions": pr_state.get("deletions"),
-                    })
-                    if pr_state is not None:
-                        logger.debug(f"Processed PR {key!r} with review {review.get('id')!r} successfully.")
-                        attempt = MAX_ATTEMPTS  # exit the loop
-                except Exception as e:
-                    logger.error(f"Failed to process PR {key!r} with review {review.get('id')!r}: {e}")
-                    attempt += 1
-                    if attempt >= MAX_ATTEMPTS:
-                        logger.error(f"Max attempts reached for PR {key!r}, skipping...")
-                        break
-    df = pd.DataFrame(records)
-    logger.info(f"Data for AI PRs processed")
-    logger.info(f"# of PRs with AILogin comments: {len(pr_2_AI_reviews.keys())}")
-    logger.info(f"Repository {args.owner}/{args.repo} processed successfully.")
-    ## TODO: clean up the code beneath, it is a bit messy, put it into a function
-    # now we can also get the non-AI reviews
-    ai_review_pr_numbers = [int(value) for value in df['pr_number'].values]
+    # gh already filters on the login, this only guards against entries without reviews or authors
+    login = args.AILogin
+    pr_2_AI_reviews = {
+        entry["number"]: kept
+        for entry in prs_with_reviews
+        if (kept := [review for review in entry.get("reviews") or () if (review.get("author") or {}).get("login") == login])
+    }
+    # one entry per AI review, so a PR with several AI reviews appears several times
+    ai_review_pr_numbers = [key for key, val in pr_2_AI_reviews.items() for _ in val]
     latest_prs = get_list_of_all_prs(owner=args.owner, repo=args.repo, state = args.status, limit=args.limit)
-    non_ai_count = len(set(latest_prs) - set(ai_review_pr_numbers))
-    non_ai_prs = list(set(latest_prs) - set(ai_review_pr_numbers))
+    # single pass over the listing, keeps the newest first order of `latest_prs`
+    ai_review_pr_set = frozenset(ai_review_pr_numbers)
+    non_ai_prs = [pr_num for pr_num in latest_prs if pr_num not in ai_review_pr_set]
+    non_ai_count = len(non_ai_prs)
     logger.info(f"Total PRs in {args.owner}/{args.repo} with non-AI reviews: {non_ai_count}")
     # spot checking a few non-AI PRs shows that they are indeed non-AI reviews but they might be bots
     # e.g. 32766 is a bot review
-    records = []
     # for now take the first N, TODO: make this more better
-    for pr_num in non_ai_prs[:2*len(ai_review_pr_numbers)]:
-        pr_state = get_pr_open_closed_and_state(args.owner, args.repo, pr_number=pr_num)
-        logger.debug(f"pr_state: {pr_state!r}")
-        records.append({
+    non_ai_prs = non_ai_prs[:2*len(ai_review_pr_numbers)]
+    # fetch the state of all the PRs we need up front, ~100 PRs per request and several requests in flight
+    pr_numbers = list(pr_2_AI_reviews) + non_ai_prs
+    # a failed batch is retried on its own, PRs still without a state after MAX_ATTEMPTS are skipped below
+    pr_states = get_pr_states_batch(args.owner, args.repo, pr_numbers, max_concurrency=args.max_concurrency, max_attempts=MAX_ATTEMPTS)
+    ai_records = []
+    for key, val in pr_2_AI_reviews.items():
+        for review in val:
+            pr_state = pr_states.get(key)
+            if pr_state is None:
+                logger.error(f"No state found for PR {key!r} with review {review.get('id')!r}, skipping...")
+                continue
+            ai_records.append({
+                "pr_number": key,
+                "review_id": review.get("id"),
+                "author_login": review.get("author", {}).get("login"),
+                "body": review.get("body"),
+                "state": review.get("state"),
+                "reviewed_at": review.get("submittedAt"),
+                "owner": args.owner,
+                "repo": args.repo,
+                "additions": pr_state.get("additions"),
+                "deletions": pr_state.get("deletions"),
+                "time_to_merge_in_seconds": pr_state.get("time_to_merge_in_seconds"),
+                "merge_state": pr_state.get("state"),
+            })
+    logger.info(f"Data for AI PRs processed, {len(ai_records)} AI reviews kept")
+    logger.info(f"# of PRs with AILogin comments: {len(pr_2_AI_reviews.keys())}")
+    logger.info(f"Repository {args.owner}/{args.repo} processed successfully.")
+    non_ai_records = []
+    not_merged_count = 0
+    for pr_num in non_ai_prs:
+        pr_state = pr_states.get(pr_num)
+        if pr_state is None:
+            logger.error(f"No state found for PR {pr_num!r}, skipping...")
+            continue
+        # a bunch of these have no time to merge so we filter them out, this seems to be primarily for PRs that are not merged, in draft state.
+        if pr_state.get("time_to_merge_in_seconds") is None:
+            not_merged_count += 1
+            continue
+        non_ai_records.append({
                 "pr_number": pr_num,
                 "review_id": pr_state.get("id"),
                 "author_login": "Non-AI Review",
@@ -159,38 +183,42 @@ def main(args) -> pd.DataFrame:
                 "reviewed_at": "N/A",
                 "owner": args.owner,
                 "repo": args.repo,
-                "pr_state": pr_state,
                 "additions": pr_state.get("additions"),
                 "deletions": pr_state.get("deletions"),
+                "time_to_merge_in_seconds": pr_state.get("time_to_merge_in_seconds"),
+                "merge_state": pr_state.get("state"),
             })
-    non_ai_prs_df = pd.DataFrame(records)
-    # now get the times of the two types of PRs
-    df['time_to_merge_in_seconds'] = df['pr_state'].apply(lambda x: x['time_to_merge_in_seconds'])
-    non_ai_prs_df['time_to_merge_in_seconds'] = non_ai_prs_df['pr_state'].apply(lambda x: x['time_to_merge_in_seconds'])
-    logger.info(f"shape of nans for non-ai PRs data: {non_ai_prs_df['time_to_merge_in_seconds'].isna().shape!r}")
-    # a bunch of these are Nan so we will filter them out, this seems to be primarily for PRs that are not merged, in draft state.
-    non_ai_prs_df = non_ai_prs_df[~non_ai_prs_df['time_to_merge_in_seconds'].isna()]
-    df = pd.concat([df, non_ai_prs_df], ignore_index=True)
+    logger.info(f"# of non-AI PRs without a time to merge: {not_merged_count}")
+    logger.info(f"# of non-AI PRs kept: {len(non_ai_records)}")
+    records = ai_records + non_ai_records
     if args.csv_write:
         # TODO: make this a cli-arg
-        df.to_csv("pr_reviews_with_and_wo_ai.csv", index=False)
+        # write the records straight out rather than through the DataFrame's to_csv
+        write_csv("pr_reviews_with_and_wo_ai.csv", records)
         logger.info(f"saved data to local file `pr_reviews_with_and_wo_ai.csv`")
-    return df
+    import pandas as pd
+    return pd.DataFrame.from_records(records)
 
 if __name__ == "__main__":
     # Example usage-will return JSONDecodeError if run with erroneous owner/repo/limit
     args = parser.parse_args()
+    if args.save_figs:
+        # nothing is shown so skip the interactive backend, must run before pyplot is imported
+        import matplotlib
+        matplotlib.use("Agg")
+    from graphics import plot_histogram, scatterplots_ai_vs_non_ai
     if not args.csv_write:
-        df = pd.read_csv("pr_reviews_with_and_wo_ai.csv")
+        # only the columns needed for the plots, skips parsing the review bodies
+        df = read_csv_columnar("pr_reviews_with_and_wo_ai.csv", usecols=["author_login", "additions", "deletions", "time_to_merge_in_seconds"])
     else:
         df = main(args)
     df["lines_modified"] = df['additions'] + df['deletions']
     if args.save_figs:
         plot_histogram(df, 'author_login', 'time_to_merge_in_seconds', funcs=[log], savefig=True)
-        plot_histogram(df, 'author_login', 'lines_modified', funcs=[lambda x: log(1+x)], savefig=True)
+        plot_histogram(df, 'author_login', 'lines_modified', funcs=[log1p], savefig=True)
     else:
         plot_histogram(df, 'author_login', 'time_to_merge_in_seconds', funcs=[log])
-        plot_histogram(df, 'author_login', 'lines_modified', funcs=[lambda x: log(1+x)])
+        plot_histogram(df, 'author_login', 'lines_modified', funcs=[log1p])
 
     ## Now some scratching to get the PRs with AI reviews
     if args.save_figs:
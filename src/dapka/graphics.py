@@ -1,58 +1,102 @@
 import logging
 
-from math import log
-from typing import Union, Callable
+from math import log, log1p, sqrt
+from typing import TYPE_CHECKING, Union, Callable
 
-import matplotlib.pyplot as plt
 import numpy as np
-import pandas as pd
+
+if TYPE_CHECKING:
+    import pandas as pd
 
 
 logger = logging.getLogger(__name__)
 
+# scalar functions with an equivalent NumPy ufunc, these are applied to the whole array at once
+FUNC_MAP = {
+    log: np.log,
+    log1p: np.log1p,
+    sqrt: np.sqrt,
+}
+
+
+def _apply_func(func: Callable, values: np.ndarray) -> np.ndarray:
+    """Apply `func` element-wise to an array of values.
 
-def plot_histogram(df: pd.DataFrame, column_name:str, metric_column_name:str, funcs=list[Union[None, Callable]], savefig:bool=False) -> None:
+    Args:
+        func (Callable): A scalar function, e.g. `math.log`, those in `FUNC_MAP` take the fast path.
+        values (np.ndarray): The values to transform.
+
+    Returns:
+        np.ndarray: The transformed values, computed by the equivalent NumPy ufunc when there is one.
+    """
+    ufunc = FUNC_MAP.get(func)
+    if ufunc is not None:
+        return ufunc(values)
+    return np.vectorize(func, otypes=[np.float64])(values)
+
+
+def plot_histogram(df: "pd.DataFrame", column_name:str, metric_column_name:str, funcs:Union[list[Callable], None]=None, savefig:bool=False) -> None:
     """Plot histograms for two slices of data.
 
     Args:
         df (pd.DataFrame): The DataFrame containing the data.
         column_name (str): The name of the column to slice the data.
         metric_column_name (str): The name of the metric column to plot.
-        funcs (list[Union[None, Callable]]): List of functions to apply to the metric values.
+        funcs (Union[list[Callable], None]): List of functions to apply to the metric values,
+            the untransformed values are always plotted as well. Defaults to None.
         savefig (bool): If True, saves the figure instead of showing it.
 
     Returns:
-        None: Displays or saves the histogram plots.
+        None: Displays or saves the histogram plots, all functions in a single figure.
     """
-    # we assume the `column_name` has two unique values, we choose the first for A
-    A = list(set(df[column_name].values))[0]
+    # pyplot is slow to import and warms up its font cache, defer it until we actually plot
+    import matplotlib.pyplot as plt
+    # we assume the `column_name` has two unique values, we choose the one in the first row for A
+    # e.g. the cli puts the AI reviews first, the first row is O(1) and deterministic unlike a set
+    A = df[column_name].iat[0]
     # Create histograms
-    # always do the identity function as one of the funcs
-    funcs.append(lambda x: x)
-    for func in funcs:
-        logger.info(f"Plotting histograms for {column_name} and {metric_column_name} with function: {func.__name__}")
-        data_A = [func(float(val)) for val in df[df[column_name]==A][metric_column_name].dropna().values]
-        data_B = [func(float(val)) for val in df[df[column_name]!=A][metric_column_name].dropna().values]
-        fig, axes = plt.subplots(nrows=2, ncols=1, figsize=(8, 6))
-        x_label, y_label = f"Value of {func.__name__}", f"Frequency of {func.__name__}"
-        axes[0].hist(data_A, bins=30, edgecolor='black', alpha=0.7, density=True)
-        axes[0].set_title(f"Histogram of {A}")
-        axes[0].set_xlabel(x_label)
-        axes[0].set_ylabel(y_label)
-        axes[1].hist(data_B, bins=30, edgecolor='black', alpha=0.7, color='orange', density=True)
-        axes[1].set_title(f"Histogram of not {A} values")
-        axes[1].set_xlabel(x_label)
-        axes[1].set_ylabel(y_label)
-        plt.tight_layout()
-        if savefig:
-            plt.savefig(f"histogram_{func.__name__}_by_{column_name}_metric_{metric_column_name}.png")
+    # always plot the untransformed values too, None stands for the identity
+    # build a new list so the caller's list is left as is
+    funcs = list(funcs or []) + [None]
+    # the slices do not depend on the function so only extract them once
+    mask = df[column_name].to_numpy() == A
+    values = df[metric_column_name].to_numpy(dtype=np.float64)
+    values_A, values_B = values[mask], values[~mask]
+    values_A, values_B = values_A[~np.isnan(values_A)], values_B[~np.isnan(values_B)]
+    # one row per function, A in the left column and not A in the right
+    fig, axes = plt.subplots(nrows=len(funcs), ncols=2, figsize=(12, 3*len(funcs)), squeeze=False)
+    for idx, func in enumerate(funcs):
+        func_name = "identity" if func is None else func.__name__
+        logger.info(f"Plotting histograms for {column_name} and {metric_column_name} with function: {func_name}")
+        if func is None:
+            data_A, data_B = values_A, values_B
         else:
-            plt.show()
-        plt.close(fig)
-        logger.info(f"Completed plotting histograms for {column_name} and {metric_column_name} with function: {func.__name__}")
+            data_A, data_B = _apply_func(func, values_A), _apply_func(func, values_B)
+        # e.g. log(0), these cannot be binned
+        data_A, data_B = data_A[np.isfinite(data_A)], data_B[np.isfinite(data_B)]
+        # bin both slices on the same edges so the two histograms are comparable
+        edges = np.histogram_bin_edges(np.concatenate([data_A, data_B]), bins=30)
+        hist_A, _ = np.histogram(data_A, bins=edges, density=True)
+        hist_B, _ = np.histogram(data_B, bins=edges, density=True)
+        x_label, y_label = f"Value of {func_name}", f"Frequency of {func_name}"
+        axes[idx, 0].bar(edges[:-1], hist_A, width=np.diff(edges), align='edge', edgecolor='black', alpha=0.7)
+        axes[idx, 0].set_title(f"Histogram of {A}")
+        axes[idx, 0].set_xlabel(x_label)
+        axes[idx, 0].set_ylabel(y_label)
+        axes[idx, 1].bar(edges[:-1], hist_B, width=np.diff(edges), align='edge', edgecolor='black', alpha=0.7, color='orange')
+        axes[idx, 1].set_title(f"Histogram of not {A} values")
+        axes[idx, 1].set_xlabel(x_label)
+        axes[idx, 1].set_ylabel(y_label)
+    fig.tight_layout()
+    if savefig:
+        fig.savefig(f"histogram_by_{column_name}_metric_{metric_column_name}.png")
+    else:
+        plt.show()
+    plt.close(fig)
+    logger.info(f"Completed plotting histograms for {column_name} and {metric_column_name}")
 
 
-def scatterplots_ai_vs_non_ai(df: pd.DataFrame, column_name:str, metric_column_name:str, x:str="lines_modified", y:str="time_to_merge_in_seconds", savefig:bool=False) -> None:
+def scatterplots_ai_vs_non_ai(df: "pd.DataFrame", column_name:str, x:str="lines_modified", y:str="time_to_merge_in_seconds", savefig:bool=False) -> None:
     """Create scatter plots for AI vs non-AI reviews and fit linear regression lines.
 
     This function generates scatter plots comparing the x and y values.
@@ -62,7 +106,6 @@ def scatterplots_ai_vs_non_ai(df: pd.DataFrame, column_name:str, metric_column_n
     Args:
         df (pd.DataFrame): The DataFrame containing the data.
         column_name (str): The name of the column to slice the data.
-        metric_column_name (str): The name of the metric column to plot.
         x (str): The name of the x-axis column.
         y (str): The name of the y-axis column.
         savefig (bool): If True, saves the figure instead of showing it.
@@ -70,28 +113,32 @@ def scatterplots_ai_vs_non_ai(df: pd.DataFrame, column_name:str, metric_column_n
     Returns:
         None: Displays or saves the scatter plots.
     """
-    A = list(set(df[column_name].values))[0]
-    copilots = df[df[column_name] == A][[x, y]]
-    not_copilots = df[df[column_name] != A][[x, y]]
-        b, a = np.polyfit(copilots[x].apply(lambda x: log(1+x)), copilots[y].apply(lambda x: log(x)), deg=1)
-        xseq = np.linspace(min(copilots[x].apply(lambda x: log(1+x))), max(copilots[x].apply(lambda x: log(1+x))), num=100)
-        b2, a2 = np.polyfit(not_copilots[x].apply(lambda x: log(1+x)), not_copilots[y].apply(lambda x: log(x)), deg=1)
-        xseq2 = np.linspace(min(not_copilots[x].apply(lambda x: log(1+x))), max(not_copilots[x].apply(lambda x: log(1+x))), num=100)
-        ## generate scatter plot
-        plt.scatter(copilots[x].apply(lambda x: log(1+x)), copilots[y].apply(lambda x: log(x)), label=f"{A} reviews", color='blue', alpha=0.5)
-        plt.scatter(not_copilots[x].apply(lambda x: log(1+x)), not_copilots[y].apply(lambda x: log(x)), label=f"not {A} reviews", color='red', alpha=0.5)
-        plt.plot(xseq, a + b * xseq, color="blue", lw=2.5)
-        plt.plot(xseq2, a2 + b2 * xseq2, color="red", lw=2.5)
-        plt.legend()
-        plt.xlabel("log(lines modified + 1)")
-        plt.ylabel("log(time to merge in seconds)")
-        plt.title(f"Scatter plot of {A} vs not {A} reviews")
-        plt.grid(True)
-        plt.tight_layout()
-        if savefig:
-            plt.savefig(f"scatterplot_{x}_by_{column_name}_metric_{y}.png")
-        else:
-            plt.show()
-        plt.close()
-        logger.info(f"Plotting scatterplot for {column_name} and {y}")
-        logger.info("Done plotting scatterplots")
\ No newline at end of file
+    import matplotlib.pyplot as plt
+    A = df[column_name].iat[0]
+    mask = df[column_name].to_numpy() == A
+    # transform each series once and reuse it for the fit, the line range and the scatter
+    log_x, log_y = np.log1p(df[x].to_numpy(dtype=np.float64)), np.log(df[y].to_numpy(dtype=np.float64))
+    log_x1, log_y1 = log_x[mask], log_y[mask]
+    log_x2, log_y2 = log_x[~mask], log_y[~mask]
+    b, a = np.polyfit(log_x1, log_y1, deg=1)
+    xseq = np.linspace(log_x1.min(), log_x1.max(), num=100)
+    b2, a2 = np.polyfit(log_x2, log_y2, deg=1)
+    xseq2 = np.linspace(log_x2.min(), log_x2.max(), num=100)
+    ## generate scatter plot
+    plt.scatter(log_x1, log_y1, label=f"{A} reviews", color='blue', alpha=0.5)
+    plt.scatter(log_x2, log_y2, label=f"not {A} reviews", color='red', alpha=0.5)
+    plt.plot(xseq, a + b * xseq, color="blue", lw=2.5)
+    plt.plot(xseq2, a2 + b2 * xseq2, color="red", lw=2.5)
+    plt.legend()
+    plt.xlabel("log(lines modified + 1)")
+    plt.ylabel("log(time to merge in seconds)")
+    plt.title(f"Scatter plot of {A} vs not {A} reviews")
+    plt.grid(True)
+    plt.tight_layout()
+    if savefig:
+        plt.savefig(f"scatterplot_{x}_by_{column_name}_metric_{y}.png")
+    else:
+        plt.show()
+    plt.close()
+    logger.info(f"Plotting scatterplot for {column_name} and {y}")
+    logger.info("Done plotting scatterplots")
\ No newline at end of file
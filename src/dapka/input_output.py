@@ -6,10 +6,24 @@
 import logging
 
 from csv import DictReader, DictWriter
+from itertools import islice
+from typing import TYPE_CHECKING, Iterable, Union
+
+if TYPE_CHECKING:
+    import pandas as pd
 
 
 logger = logging.getLogger(__name__)
 
+WRITE_BUFFER_SIZE = 1 << 20
+# the dtypes of the numeric columns written by the cli
+CSV_DTYPES = {
+    "pr_number": "int64",
+    "additions": "float64",
+    "deletions": "float64",
+    "time_to_merge_in_seconds": "float64",
+}
+
 def read_csv(file_path: str) -> list[dict]:
     """Read a CSV file and return its content as a list of dictionaries.
 
@@ -23,19 +37,50 @@ def read_csv(file_path: str) -> list[dict]:
         reader = DictReader(csvfile)
         return [row for row in reader]
 
-def write_csv(file_path: str, data: list[dict]) -> None:
-    """Write a list of dictionaries to a CSV file.
+def read_csv_columnar(file_path: str, usecols: Union[list[str], None] = None) -> "pd.DataFrame":
+    """Read a CSV file column-wise into a DataFrame.
 
     Args:
         file_path (str): The path to the CSV file.
-        data (list[dict]): A list of dictionaries to write to the CSV file.
+        usecols (list[str]): The columns to read, all columns if None. Defaults to None.
+
+    Returns:
+        pd.DataFrame: The requested columns, the numeric columns in `CSV_DTYPES` are parsed
+        straight to their NumPy dtype.
+
+    Note:
+    Prefer this over `read_csv` when the rows are consumed by column, e.g. for plotting,
+    as it avoids building a dictionary per row.
+    """
+    # pandas is slow to import, only pay for it when reading
+    import pandas as pd
+    return pd.read_csv(file_path, engine='c', dtype=CSV_DTYPES, usecols=usecols)
+
+def write_csv(file_path: str, data: Iterable[dict], chunk_size: int = 10_000) -> None:
+    """Write dictionaries to a CSV file, chunk by chunk.
+
+    Args:
+        file_path (str): The path to the CSV file.
+        data (Iterable[dict]): The dictionaries to write to the CSV file, a generator works too.
+        chunk_size (int): The number of rows written before flushing to disk. Defaults to 10_000.
+
+    Note:
+    The fieldnames are taken from the first row. Only `chunk_size` rows are pulled from
+    `data` at a time, so when `data` is a generator the rows never all sit in memory.
     """
-    if not data:
+    rows = iter(data)
+    try:
+        first_row = next(rows)
+    except StopIteration:
         logger.warning("No data provided to write to CSV.")
         return
 
-    with open(file_path, mode='w', encoding='utf-8', newline='') as csvfile:
-        writer = DictWriter(csvfile, fieldnames=data[0].keys())
+    # a large write buffer means the rows reach the disk in a few big writes
+    with open(file_path, mode='w', encoding='utf-8', newline='', buffering=WRITE_BUFFER_SIZE) as csvfile:
+        writer = DictWriter(csvfile, fieldnames=first_row.keys())
         writer.writeheader()
-        writer.writerows(data)
-    logger.info(f"Data written to {file_path} successfully.")   
+        writer.writerow(first_row)
+        while chunk := list(islice(rows, chunk_size)):
+            writer.writerows(chunk)
+            csvfile.flush()
+    logger.info(f"Data written to {file_path} successfully.")
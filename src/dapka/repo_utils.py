@@ -2,7 +2,8 @@
 This module provides utility functions for interacting with repositories, such as fetching pull requests and custom instructions for AI reviewers.
 It includes functions to retrieve pull requests with Copilot comments, parse them, and return a map of pull requests with their reviews.
 It also includes a command-line interface for fetching pull requests from a specified repository.
-It uses the GitHub CLI to fetch pull requests and their reviews, and it requires `gh` and `jq` to be installed on the system.
+It uses the GitHub CLI and API to fetch pull requests and their reviews, and it requires `gh` to be installed and authenticated on the system.
+JSON filtering is done by the `--jq` flag of `gh` itself, so no standalone `jq` (or `qj`/`gjq`) binary is needed on the path.
 The module is designed to be used as a standalone script or imported into other Python scripts for further processing.
 
 # Project: DAPKA
@@ -12,44 +13,118 @@ The module is designed to be used as a standalone script or imported into other
 # example usage:
 # python3 -i repo_utils.py  --owner rlucas7 --repo suggerere
 """
-import argparse
-from locale import format_string
-from datetime import datetime as dt
+import asyncio
+from datetime import date, datetime as dt, timedelta
+import functools
 import logging
+import os
+import shutil
+import sqlite3
 import subprocess
+import tempfile
+import threading
+import time
 
-from collections import defaultdict
-from json import loads
-from typing import Union, Any
+from json import dumps
+# orjson is an optional, much faster, drop-in for decoding the (large) gh and API responses
+try:
+    from orjson import loads
+except ImportError:
+    from json import loads
+from typing import TYPE_CHECKING, Any, Callable, Iterator, Union
+
+import requests
+from requests.adapters import HTTPAdapter
+
+if TYPE_CHECKING:
+    import argparse
+
+__all__ = [
+    "get_code_review_instructions",
+    "get_list_of_all_prs",
+    "get_list_of_all_prs_windowed",
+    "get_pr_comments",
+    "get_pr_open_closed_and_state",
+    "get_pr_states_batch",
+    "get_pr_states_bulk",
+]
 
 logger = logging.getLogger(__name__)
 
-parser = argparse.ArgumentParser(description="Get map of pull requests with Copilot comments.", formatter_class=argparse.ArgumentDefaultsHelpFormatter)
-parser.add_argument(
-    "--owner",
-    type=str,
-    required=True,
-    help="The owner of the repository.",
-)
-parser.add_argument(
-    "--repo",
-    type=str,
-    required=True,
-    help="The name of the repository.",
-)
-parser.add_argument(
-    "--limit",
-    type=int,
-    default=50000,
-    help="The maximum number of pull requests to fetch.",
-)
-parser.add_argument(
-    "--AILogin",
-    type=str,
-    default="copilot-pull-request-reviewer",
-    choices=["copilot-pull-request-reviewer", "github-copilot", "coderabbitai"],
-    help="The maximum number of pull requests to fetch.",
-)
+# resolve the gh cli once, the argv lists below are exec'd directly without a shell
+GH_BIN = shutil.which("gh") or "gh"
+GITHUB_API_URL = "https://api.github.com"
+# the number of connections kept alive to the GitHub API
+HTTP_POOL_SIZE = 16
+# on-disk cache of REST API responses and their ETags
+ETAG_CACHE_PATH = os.path.join(os.path.expanduser("~"), ".cache", "dapka", "etag_cache.sqlite")
+_ETAG_CACHE_LOCK = threading.Lock()
+# responses younger than this, in seconds, are used without asking GitHub at all
+CACHE_TTL = 60
+# in-memory cache of `get_pr_open_closed_and_state`, (owner, repo, pr_number) -> (fetch time, pr_state),
+# kept in fetch order and bounded to `PR_STATE_CACHE_SIZE` entries
+PR_STATE_CACHE_SIZE = 100_000
+_PR_STATE_CACHE: dict[tuple[str, str, int], tuple[float, dict[str, Any]]] = dict()
+_PR_STATE_CACHE_LOCK = threading.Lock()
+# maps the `--state` of `gh pr list` onto GraphQL pull request states
+PR_LIST_STATES = {
+    "open": ["OPEN"],
+    "closed": ["CLOSED", "MERGED"],
+    "merged": ["MERGED"],
+    "all": ["OPEN", "CLOSED", "MERGED"],
+}
+PR_NUMBERS_QUERY = """query($owner: String!, $name: String!, $states: [PullRequestState!], $cursor: String) {
+  repository(owner: $owner, name: $name) {
+    pullRequests(first: 100, after: $cursor, states: $states, orderBy: {field: CREATED_AT, direction: DESC}) {
+      nodes { number }
+      pageInfo { hasNextPage endCursor }
+    }
+  }
+}
+"""
+# the search API returns at most this many results for a single query, however many match
+SEARCH_RESULT_LIMIT = 1000
+PR_SEARCH_QUERY = """query($q: String!, $cursor: String) {
+  search(query: $q, type: ISSUE, first: 100, after: $cursor) {
+    issueCount
+    nodes { ... on PullRequest { number } }
+    pageInfo { hasNextPage endCursor }
+  }
+}
+"""
+# the pull request fields fetched per PR, matches the `--json` fields of `gh pr view`,
+# a tuple so the same immutable sequence is reused for every pull request
+PR_STATE_FIELDS = ("updatedAt", "mergedAt", "mergedBy", "isDraft", "state", "closed", "closedAt", "number", "labels", "author", "createdAt", "id", "additions", "deletions")
+# the maximum number of aliased pull requests in a single GraphQL query
+PR_STATE_BATCH_SIZE = 100
+# the number of times a failed batch is posted before its pull requests are given up on
+PR_STATE_MAX_ATTEMPTS = 3
+PR_STATE_GRAPHQL_FRAGMENT = """fragment prState on PullRequest {
+  updatedAt
+  mergedAt
+  mergedBy { login }
+  isDraft
+  state
+  closed
+  closedAt
+  number
+  labels(first: 100) { nodes { name } }
+  author { login }
+  createdAt
+  id
+  additions
+  deletions
+}
+"""
+
+@functools.lru_cache(maxsize=8)
+def _read_instructions(real_path: str, st_dev: int, st_ino: int, mtime_ns: int) -> str:
+    """Read a small file with a single `os.read`, cached per resolved path, file identity and modification time, see `get_code_review_instructions`."""
+    fd = os.open(real_path, os.O_RDONLY)
+    try:
+        return os.read(fd, os.fstat(fd).st_size).decode("utf-8")
+    finally:
+        os.close(fd)
 
 def get_code_review_instructions(filepath_and_name:str = ".github/copilot-instructions.md") -> Union[str, None]:
     """Get instructions for the AI reviewer.
@@ -65,14 +140,20 @@ def get_code_review_instructions(filepath_and_name:str = ".github/copilot-instru
     If the file is not found, it returns None or a default message.
     If the file is found, it reads the content and returns it as a string.
     If the file is not found, it logs a warning and returns None.
+    The file is small, so it is read with a single `os.read` of its full size on a raw file
+    descriptor and decoded as UTF-8, skipping the buffered text IO stack of `open`.
+    The contents are cached keyed on the resolved path, device, inode and modification time
+    of the file, so repeated calls only `os.stat` the file, it is read again only after it
+    changes, and the relative default path never serves another directory's file after a `chdir`.
     """
     try:
-        with open(filepath_and_name, "r") as file:
-            instructions = file.read()
-        logger.info(f"Loaded custom instructions from {filepath_and_name}")
+        real_path = os.path.realpath(filepath_and_name)
+        st = os.stat(real_path)
+        instructions = _read_instructions(real_path, st.st_dev, st.st_ino, st.st_mtime_ns)
+        logger.info("Loaded custom instructions from %s", filepath_and_name)
         return instructions
     except FileNotFoundError:
-        logger.warning(f"Custom instructions file {filepath_and_name} not found. Using default instructions.")
+        logger.warning("Custom instructions file %s not found. Using default instructions.", filepath_and_name)
         # Return None or a default message if the file is not found
         return None
 
@@ -82,37 +163,116 @@ def get_list_of_all_prs(owner: str, repo: str, state:str = "merged", limit:int =
     Args:
         owner (str): The owner of the repository.
         repo (str): The name of the repository.
-        state (str): The state of the pull requests to fetch. Defaults to 'merged'. Options are 'open', 'closed', or 'all'.
+        state (str): The state of the pull requests to fetch. Defaults to 'merged'. Options are 'open', 'closed', 'merged' or 'all'.
         limit (int): The maximum number of pull requests to fetch. Defaults to 50000.
 
     Returns:
-        list[int]: A list of pull request URLs.
+        list[int]: A list of pull request numbers, newest first.
 
     Note:
-    This function uses the GitHub CLI to fetch all pull requests from the specified repository.
-    It runs a shell command to list all pull requests and then parses the output to extract the pull request numbers.
-    It returns a list of integers representing the pull request numbers.
-    If the command fails, it raises a subprocess.CalledProcessError.
-    The command used is:
-    ```bash
-        gh pr list --repo owner/repo --state all -L limit --json number | jq '.[].number'
+    This function pages through the repository's pull requests with the GraphQL API,
+    100 at a time, fetching only the `number` of each pull request, see `PR_NUMBERS_QUERY`.
+    The states match those of `gh pr list --state`, e.g. 'closed' includes merged pull requests.
+    If a request fails, it raises a requests.RequestException.
+    """
+    variables = {"owner": owner, "name": repo, "states": PR_LIST_STATES[state], "cursor": None}
+    pr_numbers = []
+    while len(pr_numbers) < limit:
+        pull_requests = _graphql(PR_NUMBERS_QUERY, variables)["repository"]["pullRequests"]
+        pr_numbers.extend(node["number"] for node in pull_requests["nodes"])
+        if not pull_requests["pageInfo"]["hasNextPage"]:
+            break
+        variables["cursor"] = pull_requests["pageInfo"]["endCursor"]
+    pr_numbers = pr_numbers[:limit]
+    logger.info("Found %d pull requests in %s/%s", len(pr_numbers), owner, repo)
+    return pr_numbers
+
+def _date_windows(start: date, end: date, window_days: int) -> list[tuple[date, date]]:
+    """Split the inclusive range `start..end` into consecutive inclusive windows of at most `window_days` days."""
+    if window_days < 1:
+        raise ValueError(f"window_days must be at least 1, got {window_days}")
+    windows = []
+    window_start = start
+    while window_start <= end:
+        window_end = min(window_start + timedelta(days=window_days - 1), end)
+        windows.append((window_start, window_end))
+        window_start = window_end + timedelta(days=1)
+    return windows
+
+async def _search_pr_numbers(owner: str, repo: str, start: date, end: date, semaphore: asyncio.Semaphore) -> list[int]:
+    """Get the numbers of the pull requests created in `start..end`, see `get_list_of_all_prs_windowed`.
+
+    Args:
+        owner (str): The owner of the repository.
+        repo (str): The name of the repository.
+        start (date): The first creation day of the window.
+        end (date): The last creation day of the window, inclusive.
+        semaphore (asyncio.Semaphore): Bounds the number of GraphQL requests in flight.
+
+    Returns:
+        list[int]: The pull request numbers in the window.
+    """
+    variables = {"q": f"repo:{owner}/{repo} is:pr created:{start.isoformat()}..{end.isoformat()}", "cursor": None}
+    async with semaphore:
+        search = (await asyncio.to_thread(_graphql, PR_SEARCH_QUERY, variables))["search"]
+    if search["issueCount"] > SEARCH_RESULT_LIMIT:
+        if start < end:
+            # too many matches to page through, halve the window and search both halves
+            mid = start + (end - start) // 2
+            halves = await asyncio.gather(
+                _search_pr_numbers(owner, repo, start, mid, semaphore),
+                _search_pr_numbers(owner, repo, mid + timedelta(days=1), end, semaphore),
+            )
+            return halves[0] + halves[1]
+        logger.warning("%d pull requests created on %s in %s/%s, only the first %d are listed", search["issueCount"], start, owner, repo, SEARCH_RESULT_LIMIT)
+    pr_numbers = [node["number"] for node in search["nodes"]]
+    while search["pageInfo"]["hasNextPage"]:
+        variables["cursor"] = search["pageInfo"]["endCursor"]
+        async with semaphore:
+            search = (await asyncio.to_thread(_graphql, PR_SEARCH_QUERY, variables))["search"]
+        pr_numbers.extend(node["number"] for node in search["nodes"])
+    return pr_numbers
+
+async def _search_pr_numbers_windows(owner: str, repo: str, windows: list[tuple[date, date]], concurrency: int) -> list[list[int]]:
+    semaphore = asyncio.Semaphore(concurrency)
+    return await asyncio.gather(*[_search_pr_numbers(owner, repo, start, end, semaphore) for start, end in windows])
+
+def get_list_of_all_prs_windowed(owner: str, repo: str, start: date, end: date, window_days: int = 30, concurrency: int = 8) -> list[int]:
+    """Get a list of all pull requests created between `start` and `end`, searching creation date windows concurrently.
+
+    Args:
+        owner (str): The owner of the repository.
+        repo (str): The name of the repository.
+        start (date): The first creation day to include.
+        end (date): The last creation day to include.
+        window_days (int): The number of days searched by a single query. Defaults to 30.
+        concurrency (int): The maximum number of GraphQL requests in flight at once. Defaults to 8.
+
+    Returns:
+        list[int]: A list of pull request numbers, of any state, newest first.
+
+    Note:
+    Unlike `get_list_of_all_prs`, which pages through a single serial stream, this splits
+    `start..end` into windows of `window_days` days and runs one search query per window:
+    ```
+        repo:owner/repo is:pr created:2025-07-01..2025-07-30
     ```
-    We assume that the GitHub CLI (`gh`) and `jq` are installed and configured on the system where this function is executed.
+    The search API stops at `SEARCH_RESULT_LIMIT` results, so a window matching more
+    than that is halved until every part fits, there is no cap on the total.
+    The windows are searched concurrently and a pull request found in more than one
+    window is only listed once. If a request fails, it raises a requests.RequestException.
+    A `window_days` or `concurrency` below 1 raises a ValueError.
     """
-    cmd = f"gh pr list --repo {owner}/{repo} --state {state} -L {limit} --json number | jq '.[].number'"
-    try:
-        gh_cli_output = subprocess.run(cmd, shell=True, check=True, capture_output=True, text=True)
-    except subprocess.CalledProcessError as e:
-        logger.error(f"Failed to fetch listing of pull requests: {e}")
-        logger.error(f"stdout: {e.output}")
-        logger.error(f"stderr: {e.stderr}")
-        raise e
-    pr_numbers = [int(pr_num) for pr_num in gh_cli_output.stdout.split('\n') if len(pr_num) > 0]
-    logger.info(f"Found {len(pr_numbers)} pull requests in {owner}/{repo}")
+    if concurrency < 1:
+        raise ValueError(f"concurrency must be at least 1, got {concurrency}")
+    windows = _date_windows(start, end, window_days)
+    results = asyncio.run(_search_pr_numbers_windows(owner, repo, windows, concurrency))
+    pr_numbers = sorted({pr_number for result in results for pr_number in result}, reverse=True)
+    logger.info("Found %d pull requests in %s/%s created between %s and %s", len(pr_numbers), owner, repo, start, end)
     return pr_numbers
 
-def get_pr_comments(owner: str, repo: str, login:str, state:str = "all", limit:int = 50000) -> list[dict]:
-    """Get a list of pull requests with Copilot comments.
+def get_pr_comments(owner: str, repo: str, login:str, state:str = "all", limit:int = 50000, include_unreviewed:bool = False) -> Iterator[dict]:
+    """Get the pull requests reviewed by `login` and their reviews by `login`, one pull request at a time.
 
     Args:
         owner (str): The owner of the repository.
@@ -120,24 +280,239 @@ def get_pr_comments(owner: str, repo: str, login:str, state:str = "all", limit:i
         login (str): The login of the AI reviewer (e.g., 'copilot-pull-request-reviewer') for which we want to fetch the comments.
         state (str): The state of the pull requests to fetch. Defaults to 'all'. Options are 'open', 'closed', or 'all'.
         limit (int): The maximum number of pull requests to fetch. Defaults to 50000.
+        include_unreviewed (bool): If True, pull requests without a review by `login` are kept with empty reviews. Defaults to False.
 
     Returns:
-        list[dict]: a list of prs and the reviews
+        Iterator[dict]: the prs and their reviews, e.g. `{"number": 1, "reviews": [...]}`,
+        pull requests without a review by `login` are left out unless `include_unreviewed` is set.
+
+    Note:
+    The reviews are filtered on the author's login by gh's built-in jq, so the other
+    reviews never cross the pipe, and it prints one pull request per line (NDJSON):
+    ```bash
+        gh pr list --repo owner/repo --state all --json number,reviews --limit limit --jq '.[] | {number, reviews: [.reviews[] | select(.author.login == "login")]} | select(.reviews | length > 0)'
+    ```
+    With `include_unreviewed` the final `select` is dropped, so every pull request listed is printed.
+    Each line is parsed as it is read, so only one pull request is decoded in memory at a time.
+    This is a generator, the command runs when iteration starts and a failure raises
+    a subprocess.CalledProcessError once the output is exhausted.
+    """
+    logger.info("Getting pull requests with comments in %s/%s", owner, repo)
+    # a JSON string is also a valid jq string literal, this escapes any quotes in the login
+    jq_filter = f".[] | {{number, reviews: [.reviews[] | select(.author.login == {dumps(login)})]}}"
+    if not include_unreviewed:
+        jq_filter += " | select(.reviews | length > 0)"
+    cmd = [GH_BIN, "pr", "list", "--repo", f"{owner}/{repo}", "--state", state, "--json", "number,reviews", "--limit", str(limit), "--jq", jq_filter]
+    # stderr goes to a file rather than a pipe, nothing reads it until stdout is exhausted
+    # so a full stderr pipe would block gh, and this loop with it
+    with tempfile.TemporaryFile() as stderr_file:
+        # read bytes, both json and orjson decode them directly
+        with subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=stderr_file) as proc:
+            for line in proc.stdout:
+                yield loads(line)
+        if proc.returncode != 0:
+            stderr_file.seek(0)
+            e = subprocess.CalledProcessError(proc.returncode, cmd, stderr=stderr_file.read().decode())
+            logger.error("Failed to fetch pull requests: %s", e)
+            logger.error("stderr: %s", e.stderr)
+            raise e
+
+def _parse_gh_ts(timestamp: str) -> dt:
+    """Parse a GitHub timestamp, e.g. `2025-07-01T11:00:00Z`.
+
+    GitHub always sends UTC timestamps in this fixed layout, so the fields are sliced out
+    directly rather than going through `strptime` which re-parses the format on every call.
+    """
+    return dt(int(timestamp[0:4]), int(timestamp[5:7]), int(timestamp[8:10]), int(timestamp[11:13]), int(timestamp[14:16]), int(timestamp[17:19]))
+
+def _time_to_merge_in_seconds(created_at: Union[str, None], merged_at: Union[str, None]) -> Union[float, None]:
+    """Get the seconds elapsed between a pull request being created and merged.
+
+    Args:
+        created_at (str): The creation timestamp as returned by GitHub, e.g. `2025-07-01T11:00:00Z`.
+        merged_at (str): The merge timestamp as returned by GitHub, None if the PR is not merged.
+
+    Returns:
+        float: The time to merge in seconds, None if either timestamp is missing.
+    """
+    if not (created_at and merged_at):
+        return None
+    return (_parse_gh_ts(merged_at) - _parse_gh_ts(created_at)).total_seconds()
+
+# held while the shared token, session and cache connection are built, re-entrant as the session needs the token
+_BUILD_LOCK = threading.RLock()
+
+def _build_once(func: Callable[[], Any]) -> Callable[[], Any]:
+    """Cache the result of a function without arguments, like `functools.lru_cache(maxsize=None)`.
+
+    Unlike `lru_cache` the first call holds `_BUILD_LOCK`, so when the first wave of
+    `asyncio.to_thread` workers all ask at once only one of them builds the result and
+    the others wait for it, rather than each building (and then dropping) its own.
     """
-    # TODO: make this function more robust and handle no reviews case...
-    logger.info(f"Getting pull requests with comments in {owner}/{repo}")
-    # now we need to get the PR numbers from the comments
-    cmd = f"gh pr list --repo {owner}/{repo} --state {state} --json number,reviews --limit {limit}"
+    cached = functools.lru_cache(maxsize=None)(func)
+
+    @functools.wraps(func)
+    def wrapper() -> Any:
+        with _BUILD_LOCK:
+            return cached()
+
+    wrapper.cache_clear = cached.cache_clear
+    return wrapper
+
+@_build_once
+def _github_token() -> str:
+    """Get a token for the GitHub API.
+
+    Returns:
+        str: The `GITHUB_TOKEN` or `GH_TOKEN` environment variable if set, otherwise the
+        token of the user the `gh` cli is authenticated as.
+    """
+    token = os.environ.get("GITHUB_TOKEN") or os.environ.get("GH_TOKEN")
+    if token:
+        return token
     try:
-        gh_cli_output = subprocess.run(cmd, shell=True, check=True, capture_output=True, text=True)
+        gh_cli_output = subprocess.run([GH_BIN, "auth", "token"], check=True, capture_output=True, text=True)
     except subprocess.CalledProcessError as e:
-        logger.error(f"Failed to fetch pull requests: {e}")
-        logger.error(f"stdout: {e.output}")
+        logger.error(f"Failed to get a GitHub token from the gh cli: {e}")
         logger.error(f"stderr: {e.stderr}")
         raise e
-    # Parse the output to extract pull request numbers and review ids
-    pr_nums_n_comments = loads(gh_cli_output.stdout)
-    return pr_nums_n_comments
+    return gh_cli_output.stdout.strip()
+
+@_build_once
+def _session() -> requests.Session:
+    """Get the authenticated session shared by all GitHub API requests.
+
+    Returns:
+        requests.Session: A session with a pool of up to `HTTP_POOL_SIZE` kept-alive connections,
+        so the TCP and TLS handshakes are only paid once per connection rather than per request.
+
+    Note:
+    All requests go to the one API host, so a single connection pool is kept. The pool blocks
+    when all its connections are in use, so more concurrent callers than `HTTP_POOL_SIZE`
+    wait for a kept-alive connection rather than opening (and then discarding) extra ones.
+    """
+    session = requests.Session()
+    session.headers["Authorization"] = f"bearer {_github_token()}"
+    session.headers["Accept"] = "application/vnd.github+json"
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=HTTP_POOL_SIZE, pool_block=True)
+    session.mount("https://", adapter)
+    return session
+
+def _post_graphql(query: str, variables: dict[str, Any]) -> tuple[Union[dict[str, Any], None], list[dict[str, Any]]]:
+    """Run a query against the GitHub GraphQL API, returning partial results alongside any errors.
+
+    Args:
+        query (str): The GraphQL query.
+        variables (dict): The values of the variables used in the query.
+
+    Returns:
+        tuple[dict, list]: The `data` and the `errors` of the response, GitHub can return
+        both at once, e.g. a `null` field and a `NOT_FOUND` error for its path.
+    """
+    try:
+        response = _session().post(f"{GITHUB_API_URL}/graphql", json={"query": query, "variables": variables}, timeout=60)
+        response.raise_for_status()
+    except requests.RequestException as e:
+        logger.error("GraphQL request failed with exception: %s", e)
+        raise e
+    payload = loads(response.content)
+    return payload.get("data"), payload.get("errors") or []
+
+def _graphql(query: str, variables: dict[str, Any]) -> dict[str, Any]:
+    """Run a query against the GitHub GraphQL API.
+
+    Args:
+        query (str): The GraphQL query.
+        variables (dict): The values of the variables used in the query.
+
+    Returns:
+        dict: The `data` of the response.
+
+    Raises:
+        requests.HTTPError: If the response has any errors, see `_post_graphql` to handle partial results.
+    """
+    data, errors = _post_graphql(query, variables)
+    if errors:
+        logger.error("GraphQL request returned errors: %s", errors)
+        raise requests.HTTPError(f"GraphQL request returned errors: {errors}")
+    return data
+
+@_build_once
+def _etag_cache() -> sqlite3.Connection:
+    """Open the on-disk cache of GitHub API responses, creating it if needed."""
+    os.makedirs(os.path.dirname(ETAG_CACHE_PATH), exist_ok=True)
+    # shared by the threads of `get_pr_states_bulk`, access is serialized by `_ETAG_CACHE_LOCK`
+    conn = sqlite3.connect(ETAG_CACHE_PATH, check_same_thread=False)
+    conn.execute("CREATE TABLE IF NOT EXISTS etag_cache (key TEXT PRIMARY KEY, etag TEXT, body BLOB, ts INTEGER)")
+    return conn
+
+def _get_json_with_etag(path: str, ttl: float = CACHE_TTL) -> Any:
+    """GET a GitHub REST API endpoint, revalidating any cached response with its ETag.
+
+    Args:
+        path (str): The API path, e.g. `repos/owner/repo/pulls/1`, also used as the cache key.
+        ttl (float): Cached responses younger than this many seconds are returned without a request. Defaults to `CACHE_TTL`.
+
+    Returns:
+        Any: The decoded JSON response body.
+
+    Note:
+    The response body and `ETag` header are stored in a sqlite database at `ETAG_CACHE_PATH`.
+    Later calls send the stored ETag in an `If-None-Match` header, if nothing changed GitHub
+    answers `304 Not Modified` which does not count against the primary rate limit and the
+    cached body is returned, with its fetch time refreshed.
+    https://docs.github.com/en/rest/using-the-rest-api/best-practices-for-using-the-rest-api#use-conditional-requests-if-appropriate
+    """
+    conn = _etag_cache()
+    with _ETAG_CACHE_LOCK:
+        cached = conn.execute("SELECT etag, body, ts FROM etag_cache WHERE key = ?", (path,)).fetchone()
+    if cached is not None and time.time() - cached[2] < ttl:
+        logger.debug("%s fetched less than %ss ago, using the cached response", path, ttl)
+        return loads(cached[1])
+    headers = dict()
+    if cached is not None:
+        headers["If-None-Match"] = cached[0]
+    try:
+        response = _session().get(f"{GITHUB_API_URL}/{path}", headers=headers, timeout=30)
+        response.raise_for_status()
+    except requests.RequestException as e:
+        logger.error("Failed to fetch %s with exception: %s", path, e)
+        raise e
+    if response.status_code == 304:
+        logger.debug("%s not modified, using the cached response", path)
+        with _ETAG_CACHE_LOCK, conn:
+            conn.execute("UPDATE etag_cache SET ts = ? WHERE key = ?", (int(time.time()), path))
+        return loads(cached[1])
+    etag = response.headers.get("ETag")
+    if etag is not None:
+        with _ETAG_CACHE_LOCK, conn:
+            conn.execute("INSERT OR REPLACE INTO etag_cache (key, etag, body, ts) VALUES (?, ?, ?, ?)", (path, etag, response.content, int(time.time())))
+    return loads(response.content)
+
+def _pr_state_from_rest(pr_data: dict[str, Any]) -> dict[str, Any]:
+    """Map a REST API pull request onto the `gh pr view --json` field names used in `PR_STATE_FIELDS`."""
+    merged_by, author = pr_data.get("merged_by"), pr_data.get("user")
+    if pr_data.get("merged_at"):
+        state = "MERGED"
+    else:
+        state = (pr_data.get("state") or "").upper() or None
+    pr_state = {
+        "updatedAt": pr_data.get("updated_at"),
+        "mergedAt": pr_data.get("merged_at"),
+        "mergedBy": {"login": merged_by.get("login")} if merged_by else None,
+        "isDraft": pr_data.get("draft"),
+        "state": state,
+        "closed": pr_data.get("state") == "closed",
+        "closedAt": pr_data.get("closed_at"),
+        "number": pr_data.get("number"),
+        "labels": [{"name": label.get("name")} for label in pr_data.get("labels", [])],
+        "author": {"login": author.get("login")} if author else None,
+        "createdAt": pr_data.get("created_at"),
+        "id": pr_data.get("node_id"),
+        "additions": pr_data.get("additions"),
+        "deletions": pr_data.get("deletions"),
+    }
+    return pr_state
 
 def get_pr_open_closed_and_state(owner: str, repo: str, pr_number:int) -> dict[str, Any]:
     """Get a list of pull requests with their open/closed state.
@@ -148,39 +523,233 @@ def get_pr_open_closed_and_state(owner: str, repo: str, pr_number:int) -> dict[s
 
     Returns:
         dict: A dictionary with pull request numbers as keys and their open/closed state as values.
+
+    Note:
+    The pull request is fetched from the REST API as a conditional request, see `_get_json_with_etag`,
+    so repeated runs only spend rate limit on pull requests that changed since the last run.
+    The result is also kept in memory per `(owner, repo, pr_number)` for `CACHE_TTL` seconds,
+    so the returned dictionary is shared between callers and should not be modified.
+    Once `PR_STATE_CACHE_SIZE` pull requests are cached the expired entries are dropped,
+    then the oldest ones if that was not enough.
     """
-    json_fields = "updatedAt,mergedAt,mergedBy,isDraft,state,closed,closedAt,number,labels,author,createdAt,id,additions,deletions"
-    cmd = f"gh pr view {pr_number!r} --repo {owner}/{repo} --json {json_fields}"
-    try:
-        gh_cli_output = subprocess.run(cmd, shell=True, check=True, capture_output=True, text=True)
-    except subprocess.CalledProcessError as e:
-        logger.error(f"Failed to fetch pull request {pr_number} with exception: {e}")
-        logger.error(f"stdout: {e.output}")
-        logger.error(f"stderr: {e.stderr}")
-        raise e
-    pr_state_data = loads(gh_cli_output.stdout)
-    pr_state = dict()
-    for key in json_fields.split(","):
-        pr_state[key] = pr_state_data.get(key)
-    format_string = "%Y-%m-%dT%H:%M:%SZ"
-    if pr_state['createdAt'] and pr_state['mergedAt']:
-        create_time = dt.strptime(pr_state['createdAt'], format_string)
-        merge_time = dt.strptime(pr_state['mergedAt'], format_string)
-        time_to_merge_seconds = merge_time - create_time
-        pr_state['time_to_merge_in_seconds'] = time_to_merge_seconds.total_seconds()
-    else:
-        pr_state['time_to_merge_in_seconds'] = None
+    key = (owner, repo, int(pr_number))
+    cached = _PR_STATE_CACHE.get(key)
+    if cached is not None and time.monotonic() - cached[0] < CACHE_TTL:
+        return cached[1]
+    pr_state = _pr_state_from_rest(_get_json_with_etag(f"repos/{owner}/{repo}/pulls/{int(pr_number)}"))
+    pr_state['time_to_merge_in_seconds'] = _time_to_merge_in_seconds(pr_state['createdAt'], pr_state['mergedAt'])
+    now = time.monotonic()
+    with _PR_STATE_CACHE_LOCK:
+        # re-insert rather than overwrite so the dict stays in fetch order, oldest first
+        _PR_STATE_CACHE.pop(key, None)
+        if len(_PR_STATE_CACHE) >= PR_STATE_CACHE_SIZE:
+            for expired_key in [cached_key for cached_key, (fetched, _) in _PR_STATE_CACHE.items() if now - fetched >= CACHE_TTL]:
+                del _PR_STATE_CACHE[expired_key]
+            while len(_PR_STATE_CACHE) >= PR_STATE_CACHE_SIZE:
+                del _PR_STATE_CACHE[next(iter(_PR_STATE_CACHE))]
+        _PR_STATE_CACHE[key] = (now, pr_state)
     return pr_state
 
+def _build_pr_states_query(pr_numbers: list[int]) -> str:
+    """Build a GraphQL query fetching the state of several pull requests at once.
+
+    Each pull request is requested under an alias `pr0`, `pr1`, ... so the response
+    can be mapped back onto the pull request numbers in the order given.
+
+    Args:
+        pr_numbers (list[int]): The pull request numbers to include in the query.
+
+    Returns:
+        str: The GraphQL query, it expects `$owner` and `$name` variables.
+    """
+    aliases = "\n".join(f"    pr{idx}: pullRequest(number: {int(pr_number)}) {{ ...prState }}" for idx, pr_number in enumerate(pr_numbers))
+    return (
+        "query($owner: String!, $name: String!) {\n"
+        "  repository(owner: $owner, name: $name) {\n"
+        f"{aliases}\n"
+        "  }\n"
+        "}\n"
+        f"{PR_STATE_GRAPHQL_FRAGMENT}"
+    )
+
+async def _fetch_pr_states_batch(owner: str, repo: str, batch: list[int], semaphore: asyncio.Semaphore, max_attempts: int) -> dict[int, dict[str, Any]]:
+    """Fetch the state of a single batch of pull requests, see `get_pr_states_batch`.
+
+    Args:
+        owner (str): The owner of the repository.
+        repo (str): The name of the repository.
+        batch (list[int]): At most `PR_STATE_BATCH_SIZE` pull request numbers.
+        semaphore (asyncio.Semaphore): Bounds the number of GraphQL requests in flight.
+        max_attempts (int): The number of times the batch is posted before the last error is raised.
+
+    Returns:
+        dict[int, dict]: A dictionary with pull request numbers as keys and their state as values.
+    """
+    query, variables = _build_pr_states_query(batch), {"owner": owner, "name": repo}
+    # a pull request number that does not resolve comes back as a null alias and a NOT_FOUND
+    # error for its path, the rest of the batch is still valid so only those errors are ignored
+    aliases = {("repository", f"pr{idx}") for idx in range(len(batch))}
+    for attempt in range(1, max_attempts + 1):
+        try:
+            async with semaphore:
+                # requests is blocking, run it in a worker thread so the batches overlap
+                data, errors = await asyncio.to_thread(_post_graphql, query, variables)
+            errors = [error for error in errors if error.get("type") != "NOT_FOUND" or tuple(error.get("path") or ()) not in aliases]
+            if errors:
+                raise requests.HTTPError(f"GraphQL request returned errors: {errors}")
+            break
+        except requests.RequestException as e:
+            # only this batch is posted again, the other batches keep their results
+            logger.error("Failed to fetch state of pull requests %d..%d, attempt %d of %d: %s", batch[0], batch[-1], attempt, max_attempts, e)
+            if attempt >= max_attempts:
+                raise e
+    repository = data["repository"]
+    pr_states = dict()
+    missing = []
+    for idx, pr_number in enumerate(batch):
+        pr_state_data = repository.get(f"pr{idx}")
+        if pr_state_data is None:
+            missing.append(pr_number)
+            continue
+        pr_state = {key: pr_state_data.get(key) for key in PR_STATE_FIELDS}
+        pr_state['labels'] = (pr_state['labels'] or {}).get("nodes", [])
+        pr_state['time_to_merge_in_seconds'] = _time_to_merge_in_seconds(pr_state['createdAt'], pr_state['mergedAt'])
+        pr_states[pr_number] = pr_state
+    # one summary line per batch, rather than one line per unresolved pull request
+    if missing:
+        logger.warning("%d pull requests not found in %s/%s: %s", len(missing), owner, repo, missing)
+    return pr_states
+
+async def _fetch_pr_states(owner: str, repo: str, numbers: list[int], max_concurrency: int, max_attempts: int) -> dict[int, dict[str, Any]]:
+    semaphore = asyncio.Semaphore(max_concurrency)
+    batches = [numbers[start:start + PR_STATE_BATCH_SIZE] for start in range(0, len(numbers), PR_STATE_BATCH_SIZE)]
+    results = await asyncio.gather(*[_fetch_pr_states_batch(owner, repo, batch, semaphore, max_attempts) for batch in batches], return_exceptions=True)
+    pr_states = dict()
+    for batch, result in zip(batches, results):
+        if isinstance(result, requests.RequestException):
+            logger.error("Max attempts reached for pull requests %d..%d in %s/%s, skipping...", batch[0], batch[-1], owner, repo)
+            continue
+        if isinstance(result, BaseException):
+            raise result
+        pr_states.update(result)
+    return pr_states
+
+def get_pr_states_batch(owner: str, repo: str, numbers: list[int], max_concurrency: int = 5, max_attempts: int = PR_STATE_MAX_ATTEMPTS) -> dict[int, dict[str, Any]]:
+    """Get the open/closed state of many pull requests with batched GraphQL queries.
+
+    Args:
+        owner (str): The owner of the repository.
+        repo (str): The name of the repository.
+        numbers (list[int]): The pull request numbers to fetch.
+        max_concurrency (int): The maximum number of GraphQL requests in flight at once. Defaults to 5.
+        max_attempts (int): The number of times a failed batch is posted. Defaults to `PR_STATE_MAX_ATTEMPTS`.
+
+    Returns:
+        dict[int, dict]: A dictionary with pull request numbers as keys and the same
+        state dictionary as `get_pr_open_closed_and_state` as values.
+
+    Note:
+    Rather than one request per pull request this issues one GraphQL request per
+    `PR_STATE_BATCH_SIZE` pull requests, each pull request being an aliased field:
+    ```graphql
+        query { repository(...) { pr0: pullRequest(number: 1) {...} pr1: ... } }
+    ```
+    The requests are posted straight to the GraphQL API over the shared session, see `_post_graphql`,
+    rather than through a `gh api graphql` process per batch.
+    The batches are sent concurrently, at most `max_concurrency` at a time, keep this
+    small to stay clear of GitHub's secondary rate limits, a value below 1 raises a ValueError.
+    Duplicate pull request numbers are only fetched once and pull requests that cannot
+    be resolved, i.e. a `NOT_FOUND` error for their alias, are logged and left out of the
+    returned dictionary. A batch that fails, with a request or any other GraphQL error,
+    is retried on its own up to `max_attempts` times, then its pull requests are logged
+    and left out too, the batches that succeeded are kept.
+    """
+    # a semaphore of 0 would never let a request through and asyncio.run would wait forever
+    if max_concurrency < 1:
+        raise ValueError(f"max_concurrency must be at least 1, got {max_concurrency}")
+    # a PR can be requested more than once, e.g. once per review, only fetch it once
+    numbers = list(dict.fromkeys(numbers))
+    pr_states = asyncio.run(_fetch_pr_states(owner, repo, numbers, max_concurrency, max_attempts))
+    logger.info("Fetched state of %d of %d pull requests in %s/%s", len(pr_states), len(numbers), owner, repo)
+    return pr_states
+
+async def _fetch_pr_states_rest(owner: str, repo: str, pr_numbers: list[int], concurrency: int) -> list[Union[dict[str, Any], BaseException]]:
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def fetch(pr_number: int) -> dict[str, Any]:
+        async with semaphore:
+            return await asyncio.to_thread(get_pr_open_closed_and_state, owner, repo, pr_number)
+
+    return await asyncio.gather(*[fetch(pr_number) for pr_number in pr_numbers], return_exceptions=True)
+
+def get_pr_states_bulk(owner: str, repo: str, pr_numbers: list[int], concurrency: int = HTTP_POOL_SIZE) -> dict[int, dict[str, Any]]:
+    """Get the open/closed state of many pull requests with concurrent REST requests.
+
+    Args:
+        owner (str): The owner of the repository.
+        repo (str): The name of the repository.
+        pr_numbers (list[int]): The pull request numbers to fetch.
+        concurrency (int): The maximum number of requests in flight at once. Defaults to `HTTP_POOL_SIZE`.
+
+    Returns:
+        dict[int, dict]: A dictionary with pull request numbers as keys and the state from
+        `get_pr_open_closed_and_state` as values, pull requests that failed are logged and left out.
+
+    Note:
+    Unlike `get_pr_states_batch` every pull request is a separate conditional request, so
+    this is the cheaper choice when most pull requests are already in the ETag cache,
+    unchanged pull requests then cost no rate limit at all.
+    A `concurrency` below 1 raises a ValueError.
+    """
+    if concurrency < 1:
+        raise ValueError(f"concurrency must be at least 1, got {concurrency}")
+    results = asyncio.run(_fetch_pr_states_rest(owner, repo, pr_numbers, concurrency))
+    pr_states = dict()
+    for pr_number, result in zip(pr_numbers, results):
+        if isinstance(result, BaseException):
+            logger.error("Failed to fetch pull request %d with exception: %s", pr_number, result)
+            continue
+        pr_states[pr_number] = result
+    logger.info("Fetched state of %d of %d pull requests in %s/%s", len(pr_states), len(pr_numbers), owner, repo)
+    return pr_states
+
+def _build_parser() -> "argparse.ArgumentParser":
+    """Build the parser of the command line arguments, only needed when run as a script."""
+    import argparse
+    parser = argparse.ArgumentParser(description="Get map of pull requests with Copilot comments.", formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument(
+        "--owner",
+        type=str,
+        required=True,
+        help="The owner of the repository.",
+    )
+    parser.add_argument(
+        "--repo",
+        type=str,
+        required=True,
+        help="The name of the repository.",
+    )
+    parser.add_argument(
+        "--limit",
+        type=int,
+        default=50000,
+        help="The maximum number of pull requests to fetch.",
+    )
+    parser.add_argument(
+        "--AILogin",
+        type=str,
+        default="copilot-pull-request-reviewer",
+        choices=["copilot-pull-request-reviewer", "github-copilot", "coderabbitai"],
+        help="The maximum number of pull requests to fetch.",
+    )
+    return parser
+
 
 if __name__ == "__main__":
     # Example usage-will return JSONDecodeError if run with erroneous owner/repo/limit
-    args = parser.parse_args()
+    args = _build_parser().parse_args()
     owner, repo, limit, login = args.owner, args.repo, args.limit, args.AILogin
-    prs_with_reviews = get_pr_comments(owner=owner, repo=repo, login=login, state="merged", limit=limit)
-    # now filter to only those with copilot comments
-    pr_2_AI_reviews = dict()
-    for entry in prs_with_reviews:
-        pr_num, reviews = entry.get("number"), entry.get("reviews", [])
-        pr_2_AI_reviews[pr_num] = [review for review in reviews if review.get("author", {}).get("login") == login]
+    # keep the PRs without AILogin reviews too, as empty lists, so the share of reviewed PRs can be computed
+    prs_with_reviews = get_pr_comments(owner=owner, repo=repo, login=login, state="merged", limit=limit, include_unreviewed=True)
+    pr_2_AI_reviews = {entry["number"]: entry["reviews"] for entry in prs_with_reviews}
     print(f"Pull requests with AILogin comments: {pr_2_AI_reviews}")
\ No newline at end of file
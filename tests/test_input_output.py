@@ -0,0 +1,27 @@
+"""
+This module contains unit tests for the input_output.py module.
+"""
+
+from dapka.input_output import read_csv, read_csv_columnar, write_csv
+
+
+class TestInputOutput:
+    def test_write_csv_from_generator_in_chunks(self, tmp_path):
+        file_path = str(tmp_path / "prs.csv")
+        write_csv(file_path, ({"pr_number": i, "additions": 2 * i} for i in range(7)), chunk_size=3)
+        rows = read_csv(file_path)
+        assert len(rows) == 7
+        assert rows[-1] == {"pr_number": "6", "additions": "12"}
+
+    def test_write_csv_no_data(self, tmp_path):
+        file_path = tmp_path / "empty.csv"
+        write_csv(str(file_path), [])
+        assert not file_path.exists()
+
+    def test_read_csv_columnar_dtypes(self, tmp_path):
+        file_path = str(tmp_path / "prs.csv")
+        write_csv(file_path, [{"pr_number": 1, "body": "LGTM", "time_to_merge_in_seconds": 30.0}])
+        df = read_csv_columnar(file_path, usecols=["pr_number", "time_to_merge_in_seconds"])
+        assert list(df.columns) == ["pr_number", "time_to_merge_in_seconds"]
+        assert df["pr_number"].dtype == "int64"
+        assert df["time_to_merge_in_seconds"].dtype == "float64"
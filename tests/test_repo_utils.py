@@ -2,9 +2,20 @@
 This module contains unit tests for the repo_utils.py module. 
 """
 
+import os
+import tempfile
+import threading
+import time
 import unittest
+from unittest import mock
+
 import pytest
 
+from datetime import date, datetime
+
+from dapka import repo_utils
+from dapka.repo_utils import _build_pr_states_query, _date_windows, _parse_gh_ts, _time_to_merge_in_seconds, get_code_review_instructions
+
 class testRepoUtilsModule(unittest.TestCase):
     def setUp(self):
         # Set up any necessary resources or configurations before each test method is called.
@@ -28,3 +39,261 @@ class testRepoUtilsModule(unittest.TestCase):
         foo = get_code_review_instructions()
         return isinstance(foo, str)
 
+    def test_get_code_review_instructions_follows_the_working_directory(self):
+        cwd = os.getcwd()
+        with tempfile.TemporaryDirectory() as first, tempfile.TemporaryDirectory() as second:
+            for directory, text in ((first, "first"), (second, "second")):
+                os.makedirs(os.path.join(directory, ".github"))
+                path = os.path.join(directory, self.instructions_file_path)
+                with open(path, "w") as file:
+                    file.write(text)
+                # same relative name and same mtime, only the directory differs
+                os.utime(path, ns=(0, 0))
+            try:
+                os.chdir(first)
+                self.assertEqual(get_code_review_instructions(), "first")
+                os.chdir(second)
+                self.assertEqual(get_code_review_instructions(), "second")
+            finally:
+                os.chdir(cwd)
+
+    def test_time_to_merge_in_seconds(self):
+        self.assertEqual(_time_to_merge_in_seconds("2025-07-01T11:00:00Z", "2025-07-01T12:00:30Z"), 3630.0)
+        self.assertIsNone(_time_to_merge_in_seconds("2025-07-01T11:00:00Z", None))
+
+    def test_parse_gh_ts_matches_strptime(self):
+        timestamp = "2025-07-01T09:05:07Z"
+        self.assertEqual(_parse_gh_ts(timestamp), datetime.strptime(timestamp, "%Y-%m-%dT%H:%M:%SZ"))
+
+    def test_build_pr_states_query_aliases_each_pr(self):
+        query = _build_pr_states_query([12, 7])
+        self.assertIn("pr0: pullRequest(number: 12)", query)
+        self.assertIn("pr1: pullRequest(number: 7)", query)
+        self.assertIn("fragment prState on PullRequest", query)
+
+    def test_get_pr_states_bulk_skips_and_logs_failed_prs(self):
+        def fake_state(owner, repo, pr_number):
+            if pr_number == 2:
+                raise repo_utils.requests.HTTPError("404 Client Error: Not Found")
+            return {"number": pr_number}
+
+        with mock.patch.object(repo_utils, "get_pr_open_closed_and_state", side_effect=fake_state):
+            with self.assertLogs(repo_utils.logger, level="ERROR") as logs:
+                pr_states = repo_utils.get_pr_states_bulk(self.repo_owner, self.repo_name, [1, 2, 3], concurrency=2)
+        self.assertEqual(pr_states, {1: {"number": 1}, 3: {"number": 3}})
+        self.assertIn("Failed to fetch pull request 2", logs.output[0])
+
+    def test_session_and_token_are_built_once_under_concurrent_first_calls(self):
+        def slow(*args, **kwargs):
+            # widen the window in which a second thread could start its own build
+            time.sleep(0.05)
+            return mock.DEFAULT
+
+        repo_utils._session.cache_clear()
+        repo_utils._github_token.cache_clear()
+        try:
+            with mock.patch.dict(os.environ, {"GITHUB_TOKEN": "", "GH_TOKEN": ""}), \
+                    mock.patch.object(repo_utils.subprocess, "run", side_effect=slow) as run, \
+                    mock.patch.object(repo_utils.requests, "Session", side_effect=slow) as session:
+                run.return_value.stdout = "token\n"
+                threads = [threading.Thread(target=repo_utils._session) for _ in range(8)]
+                for thread in threads:
+                    thread.start()
+                for thread in threads:
+                    thread.join()
+            self.assertEqual(run.call_count, 1)
+            self.assertEqual(session.call_count, 1)
+        finally:
+            repo_utils._session.cache_clear()
+            repo_utils._github_token.cache_clear()
+
+    def test_concurrency_below_one_is_rejected(self):
+        with self.assertRaises(ValueError):
+            repo_utils.get_pr_states_batch(self.repo_owner, self.repo_name, [1, 2], max_concurrency=0)
+        with self.assertRaises(ValueError):
+            repo_utils.get_pr_states_bulk(self.repo_owner, self.repo_name, [1, 2], concurrency=-1)
+
+    def test_date_windows_cover_the_range_without_overlap(self):
+        windows = _date_windows(date(2025, 1, 1), date(2025, 3, 2), 30)
+        self.assertEqual(windows[0], (date(2025, 1, 1), date(2025, 1, 30)))
+        self.assertEqual(windows[-1], (date(2025, 3, 2), date(2025, 3, 2)))
+        for (_, prev_end), (next_start, _) in zip(windows, windows[1:]):
+            self.assertEqual((next_start - prev_end).days, 1)
+        with self.assertRaises(ValueError):
+            _date_windows(date(2025, 1, 1), date(2025, 1, 3), 0)
+        with self.assertRaises(ValueError):
+            repo_utils.get_list_of_all_prs_windowed(self.repo_owner, self.repo_name, date(2025, 1, 1), date(2025, 1, 3), concurrency=0)
+
+    def test_get_pr_states_batch_leaves_out_unresolved_prs(self):
+        payload = {
+            "data": {"repository": {"pr0": {"number": 5, "createdAt": "2025-07-01T11:00:00Z", "mergedAt": None, "labels": {"nodes": []}}, "pr1": None}},
+            "errors": [{"type": "NOT_FOUND", "path": ["repository", "pr1"], "message": "Could not resolve to a PullRequest with the number of 6."}],
+        }
+        with mock.patch.object(repo_utils, "_session") as session:
+            session.return_value.post.return_value = _response(200, repo_utils.dumps(payload).encode())
+            with self.assertLogs(repo_utils.logger, level="WARNING") as logs:
+                pr_states = repo_utils.get_pr_states_batch(self.repo_owner, self.repo_name, [5, 6])
+        self.assertEqual(list(pr_states), [5])
+        self.assertIsNone(pr_states[5]["time_to_merge_in_seconds"])
+        self.assertIn("[6]", logs.output[0])
+
+    def test_get_pr_states_batch_retries_and_skips_only_the_failed_batch(self):
+        failed = {"data": {"repository": None}, "errors": [{"type": "NOT_FOUND", "path": ["repository"], "message": "Could not resolve to a Repository."}]}
+        resolved = {"data": {"repository": {"pr0": {"number": 5, "createdAt": "2025-07-01T11:00:00Z", "mergedAt": None, "labels": {"nodes": []}}}}}
+
+        def post(url, json, timeout):
+            # PR 5 resolves, the batch of PR 6 always fails
+            payload = resolved if "pullRequest(number: 5)" in json["query"] else failed
+            return _response(200, repo_utils.dumps(payload).encode())
+
+        with mock.patch.object(repo_utils, "PR_STATE_BATCH_SIZE", 1), mock.patch.object(repo_utils, "_session") as session:
+            session.return_value.post.side_effect = post
+            with self.assertLogs(repo_utils.logger, level="ERROR") as logs:
+                pr_states = repo_utils.get_pr_states_batch(self.repo_owner, self.repo_name, [5, 6], max_attempts=3)
+        self.assertEqual(list(pr_states), [5])
+        # one post for the batch that resolved, three for the one that kept failing
+        self.assertEqual(session.return_value.post.call_count, 4)
+        self.assertIn("Max attempts reached for pull requests 6..6", logs.output[-1])
+
+    def test_get_list_of_all_prs_windowed_halves_pages_and_dedupes(self):
+        prs_by_day = {
+            date(2025, 1, 1): [1, 2],
+            date(2025, 1, 2): [3],
+            # more than the search limit on a single day, cannot be split any further
+            date(2025, 1, 3): [4, 5, 6, 7],
+            # 3 again, a PR seen in two windows is only listed once
+            date(2025, 1, 4): [3],
+        }
+        queries = []
+
+        def fake_graphql(query, variables):
+            # pages of 2 so a window of 3 needs a second page, and at most SEARCH_RESULT_LIMIT results
+            queries.append(variables["q"])
+            start, end = (date.fromisoformat(day) for day in variables["q"].rsplit("created:", 1)[1].split(".."))
+            numbers = [number for day, day_numbers in prs_by_day.items() if start <= day <= end for number in day_numbers]
+            cursor = int(variables["cursor"] or 0)
+            available = numbers[:repo_utils.SEARCH_RESULT_LIMIT]
+            return {"search": {
+                "issueCount": len(numbers),
+                "nodes": [{"number": number} for number in available[cursor:cursor + 2]],
+                "pageInfo": {"hasNextPage": cursor + 2 < len(available), "endCursor": str(cursor + 2)},
+            }}
+
+        with mock.patch.object(repo_utils, "SEARCH_RESULT_LIMIT", 3), mock.patch.object(repo_utils, "_graphql", side_effect=fake_graphql):
+            with self.assertLogs(repo_utils.logger, level="WARNING") as logs:
+                pr_numbers = repo_utils.get_list_of_all_prs_windowed(self.repo_owner, self.repo_name, date(2025, 1, 1), date(2025, 1, 4), window_days=2)
+        self.assertEqual(pr_numbers, [6, 5, 4, 3, 2, 1])
+        # 2025-01-03..2025-01-04 matched 5 > 3 PRs and was halved
+        self.assertIn("repo:rlucas7/suggerere is:pr created:2025-01-03..2025-01-03", queries)
+        self.assertIn("repo:rlucas7/suggerere is:pr created:2025-01-04..2025-01-04", queries)
+        # the first window fits and needed a second page
+        self.assertEqual(queries.count("repo:rlucas7/suggerere is:pr created:2025-01-01..2025-01-02"), 2)
+        self.assertEqual(len(logs.output), 1)
+        self.assertIn("4 pull requests created on 2025-01-03", logs.output[0])
+
+def _response(status_code, content=b"", etag=None):
+    """A stand-in for a `requests.Response` from the GitHub REST API."""
+    response = mock.Mock(status_code=status_code, content=content, headers={"ETag": etag} if etag else {})
+    response.raise_for_status.return_value = None
+    return response
+
+class testEtagCache(unittest.TestCase):
+    def setUp(self):
+        # point the on-disk cache at a fresh database and stub out the HTTP session
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.patches = [
+            mock.patch.object(repo_utils, "ETAG_CACHE_PATH", os.path.join(self.tmpdir.name, "etag_cache.sqlite")),
+            mock.patch.object(repo_utils, "_session"),
+        ]
+        for patch in self.patches:
+            patch.start()
+        repo_utils._etag_cache.cache_clear()
+        self.session = repo_utils._session.return_value
+        self.path = "repos/rlucas7/suggerere/pulls/1"
+
+    def tearDown(self):
+        repo_utils._etag_cache().close()
+        repo_utils._etag_cache.cache_clear()
+        for patch in self.patches:
+            patch.stop()
+        self.tmpdir.cleanup()
+
+    def cached_row(self):
+        return repo_utils._etag_cache().execute("SELECT etag, body, ts FROM etag_cache WHERE key = ?", (self.path,)).fetchone()
+
+    def test_200_with_etag_is_stored(self):
+        self.session.get.return_value = _response(200, b'{"number": 1}', etag='"abc"')
+        self.assertEqual(repo_utils._get_json_with_etag(self.path, ttl=0), {"number": 1})
+        self.session.get.assert_called_once_with(f"{repo_utils.GITHUB_API_URL}/{self.path}", headers={}, timeout=30)
+        self.assertEqual(self.cached_row()[:2], ('"abc"', b'{"number": 1}'))
+
+    def test_304_revalidates_and_serves_the_cached_body(self):
+        self.session.get.return_value = _response(200, b'{"number": 1}', etag='"abc"')
+        repo_utils._get_json_with_etag(self.path, ttl=0)
+        self.session.get.return_value = _response(304)
+        self.assertEqual(repo_utils._get_json_with_etag(self.path, ttl=0), {"number": 1})
+        self.assertEqual(self.session.get.call_args.kwargs["headers"], {"If-None-Match": '"abc"'})
+
+    def test_200_without_etag_is_not_stored(self):
+        self.session.get.return_value = _response(200, b'{"number": 1}')
+        self.assertEqual(repo_utils._get_json_with_etag(self.path, ttl=0), {"number": 1})
+        self.assertIsNone(self.cached_row())
+
+    def test_ttl_skips_the_request_for_a_fresh_response(self):
+        self.session.get.return_value = _response(200, b'{"number": 1}', etag='"abc"')
+        with mock.patch.object(repo_utils.time, "time", return_value=1000.0):
+            repo_utils._get_json_with_etag(self.path, ttl=60)
+        with mock.patch.object(repo_utils.time, "time", return_value=1030.0):
+            self.assertEqual(repo_utils._get_json_with_etag(self.path, ttl=60), {"number": 1})
+        self.assertEqual(self.session.get.call_count, 1)
+        with mock.patch.object(repo_utils.time, "time", return_value=1061.0):
+            repo_utils._get_json_with_etag(self.path, ttl=60)
+        self.assertEqual(self.session.get.call_count, 2)
+
+    def test_304_refreshes_the_fetch_time(self):
+        self.session.get.return_value = _response(200, b'{"number": 1}', etag='"abc"')
+        with mock.patch.object(repo_utils.time, "time", return_value=1000.0):
+            repo_utils._get_json_with_etag(self.path, ttl=60)
+        self.session.get.return_value = _response(304)
+        with mock.patch.object(repo_utils.time, "time", return_value=1100.0):
+            repo_utils._get_json_with_etag(self.path, ttl=60)
+        self.assertEqual(self.cached_row()[2], 1100)
+        # fresh again after the revalidation, so no further request
+        with mock.patch.object(repo_utils.time, "time", return_value=1130.0):
+            repo_utils._get_json_with_etag(self.path, ttl=60)
+        self.assertEqual(self.session.get.call_count, 2)
+
+class testPrStateCache(unittest.TestCase):
+    def setUp(self):
+        self.patches = [
+            mock.patch.object(repo_utils, "_PR_STATE_CACHE", dict()),
+            mock.patch.object(repo_utils, "PR_STATE_CACHE_SIZE", 2),
+            mock.patch.object(repo_utils, "_get_json_with_etag", side_effect=lambda path: {"number": int(path.rsplit("/", 1)[1])}),
+        ]
+        for patch in self.patches:
+            patch.start()
+
+    def tearDown(self):
+        for patch in self.patches:
+            patch.stop()
+
+    def get_state_at(self, pr_number, now):
+        with mock.patch.object(repo_utils.time, "monotonic", return_value=now):
+            return repo_utils.get_pr_open_closed_and_state("rlucas7", "suggerere", pr_number)
+
+    def test_fresh_states_are_served_from_memory(self):
+        self.get_state_at(1, 0.0)
+        self.get_state_at(1, 30.0)
+        self.assertEqual(repo_utils._get_json_with_etag.call_count, 1)
+        self.get_state_at(1, 61.0)
+        self.assertEqual(repo_utils._get_json_with_etag.call_count, 2)
+
+    def test_cache_is_bounded(self):
+        self.get_state_at(1, 0.0)
+        self.get_state_at(2, 70.0)
+        # 1 has expired and is dropped first
+        self.get_state_at(3, 80.0)
+        self.assertEqual([key[2] for key in repo_utils._PR_STATE_CACHE], [2, 3])
+        # nothing has expired, the oldest entry is dropped
+        self.get_state_at(4, 90.0)
+        self.assertEqual([key[2] for key in repo_utils._PR_STATE_CACHE], [3, 4])